@@ -2,17 +2,30 @@
 # Python flask server to interact with webGL.
 # Octavio Navarro. 2024
 
-from flask import Flask, request, jsonify
+import json
+import threading
+import time
+from flask import Flask, Response, request, jsonify
 from flask_cors import CORS, cross_origin
 from randomAgents.model import RandomModel
 from randomAgents.agent import RandomAgent, ObstacleAgent
+from change_log import ChangeLog
+from encoding import BINARY_MIMETYPE, pack_positions
+from simulation_worker import SimulationWorker
 
 # Size of the board:
 number_agents = 10
 width = 28
 height = 28
 randomModel = None
+changeLog = None
 currentStep = 0
+# Background simulation: number of steps computed ahead of the client (0 runs each step inside /update)
+background_steps = 0
+worker = None
+# Last step acknowledged by the stream client, for the ?window backpressure of /stream
+streamAck = 0
+streamCondition = threading.Condition()
 
 # This application will be used to interact with WebGL
 app = Flask("Traffic example")
@@ -23,13 +36,14 @@ cors = CORS(app, origins=['http://localhost'])
 @app.route('/init', methods=['GET', 'POST'])
 @cross_origin()
 def initModel():
-    global currentStep, randomModel, number_agents, width, height
+    global currentStep, randomModel, changeLog, worker, number_agents, width, height, background_steps
 
     if request.method == 'POST':
         try:
             number_agents = int(request.json.get('NAgents'))
             width = int(request.json.get('width'))
             height = int(request.json.get('height'))
+            background_steps = int(request.json.get('backgroundSteps', 0))
             currentStep = 0
 
         except Exception as e:
@@ -39,43 +53,108 @@ def initModel():
     print(f"Model parameters:{number_agents, width, height}")
 
     # Create the model using the parameters sent by the application
-    randomModel = RandomModel(number_agents, width, height)
+    if worker is not None:
+        worker.stop()
+        worker = None
+
+    with streamCondition:
+        randomModel = RandomModel(number_agents, width, height)
+        changeLog = ChangeLog(lambda: agentSnapshot(randomModel), currentStep)
+        # Wakes up the streams waiting for an acknowledgement, so they end
+        streamCondition.notify_all()
+
+    if background_steps > 0:
+        # The worker diffs the steps with its own log, and changeLog only gets the frames the client consumed
+        workerLog = ChangeLog(lambda: agentSnapshot(randomModel), currentStep, max_steps=1)
+        worker = SimulationWorker(lambda: simulateStep(randomModel, workerLog, True), background_steps)
 
     # Return a message to saying that the model was created successfully
     return jsonify({"message": f"Parameters recieved, model initiated.\nSize: {width}x{height}"})
 
 
+def agentSnapshot(model):
+    """Current {id: (x, z)} of the RandomAgents, read from the model's agent sets instead of the grid."""
+    return {
+        str(a.unique_id): a.cell.coordinate
+        for a in model.agents_by_type.get(RandomAgent, [])
+        if a.cell is not None
+    }
+
+def positionList(positions):
+    return [
+        {"id": agentId, "x": coordinate[0], "y":1, "z":coordinate[1]}
+        for agentId, coordinate in positions.items()
+    ]
+
+def simulateStep(model, log, serialise=False):
+    """
+    Advances the model one step and records its changes in log.
+    Returns:
+        dict: The frame of the step. With serialise, it also has the frame ready to
+              send as JSON and binary, so requests served from a worker do no work.
+    """
+    model.step()
+    step = log.step + 1
+    changed, removed = log.record(step)
+    frame = {'step': step, 'changed': changed, 'removed': removed}
+    if serialise:
+        serialiseFrame(frame)
+    return frame
+
+def serialiseFrame(frame):
+    frame['json'] = positionFrame(frame['step'], False, frame['changed'], frame['removed'])
+    frame['binary'] = pack_positions(frame['step'], False, frame['changed'], frame['removed'])
+
+def nextFrame():
+    """Frame of the next step, taken from the worker when the simulation runs in the background."""
+    if worker is None:
+        return simulateStep(randomModel, changeLog)
+
+    frame = worker.pop()
+    changeLog.apply(frame['step'], frame['changed'], frame['removed'])
+    return frame
+
+def wantsBinary():
+    """Whether the client asked for the binary format, with ?format=binary or the Accept header."""
+    if request.args.get('format') == 'binary':
+        return True
+    return request.accept_mimetypes.best_match(['application/json', BINARY_MIMETYPE]) == BINARY_MIMETYPE
+
+def positionFrame(step, full, positions, removed=()):
+    frame = {'positions': positionList(positions), 'currentStep': step, 'full': full}
+    if not full:
+        frame['removed'] = list(removed)
+    return frame
+
+def positionsResponse(step, full, positions, removed=()):
+    """Positions in the format the client asked for. See encoding.pack_positions for the binary layout."""
+    if wantsBinary():
+        return Response(pack_positions(step, full, positions, removed), mimetype=BINARY_MIMETYPE)
+
+    return jsonify(positionFrame(step, full, positions, removed))
+
 # This route will be used to get the positions of the agents
+# Answers in binary when asked with Accept: application/octet-stream or ?format=binary.
+# With ?since=<step> only the agents that moved or spawned after that step are sent,
+# plus the ids of the removed ones. If the log does not reach that far back, the full list is sent.
 @app.route('/getAgents', methods=['GET'])
 @cross_origin()
 def getAgents():
-    global randomModel
+    global randomModel, changeLog
 
     if request.method == 'GET':
         # Get the positions of the agents and return them to WebGL in JSON.json.t.
         # Note that the positions are sent as a list of dictionaries, where each dictionary has the id and position of an agent.
         # The y coordinate is set to 1, since the agents are in a 3D world. The z coordinate corresponds to the row (y coordinate) of the grid in mesa.
         try:
-            agentCells = randomModel.grid.all_cells.select(
-                lambda cell: any(isinstance(obj, RandomAgent) for obj in cell.agents)
-            ).cells
-            # print(f"CELLS: {agentCells}")
+            since = request.args.get('since', type=int)
+            delta = changeLog.since(since) if since is not None else None
 
-            agents = [
-                (cell.coordinate, agent)
-                for cell in agentCells
-                for agent in cell.agents
-                if isinstance(agent, RandomAgent)
-            ]
-            # print(f"AGENTS: {agents}")
+            if delta is None:
+                return positionsResponse(changeLog.step, True, changeLog.positions)
 
-            agentPositions = [
-                {"id": str(a.unique_id), "x": coordinate[0], "y":1, "z":coordinate[1]}
-                for (coordinate, a) in agents
-            ]
-            # print(f"AGENT POSITIONS: {agentPositions}")
-
-            return jsonify({'positions': agentPositions})
+            changed, removed = delta
+            return positionsResponse(changeLog.step, False, changed, removed)
         except Exception as e:
             print(e)
             return jsonify({"message": "Error with the agent positions"}), 500
@@ -116,20 +195,113 @@ def getObstacles():
             return jsonify({"message": "Error with obstacle positions"}), 500
 
 # This route will be used to update the model
+# ?steps=k advances k steps in one request (at most MAX_STEPS_PER_UPDATE).
+# With &frames=true the response also has the changes of every step, as a list of
+# delta frames in JSON, or as the binary frames one after the other.
+# When the model runs in a background worker (backgroundSteps in /init), the steps are
+# taken from the frames it already computed, and /getAgents serves the steps taken so far.
+MAX_STEPS_PER_UPDATE = 100
+
 @app.route('/update', methods=['GET'])
 @cross_origin()
 def updateModel():
     global currentStep, randomModel
     if request.method == 'GET':
         try:
+            steps = request.args.get('steps', default=1, type=int)
+            steps = max(1, min(steps, MAX_STEPS_PER_UPDATE))
+            sendFrames = request.args.get('frames') == 'true'
+
         # Update the model and return a message to WebGL saying that the model was updated successfully
-            randomModel.step()
-            currentStep += 1
-            return jsonify({'message': f'Model updated to step {currentStep}.', 'currentStep':currentStep})
+            frames = []
+            for _ in range(steps):
+                frame = nextFrame()
+                currentStep = frame['step']
+                if sendFrames:
+                    if 'json' not in frame:
+                        serialiseFrame(frame)
+                    frames.append(frame)
+
+            if sendFrames and wantsBinary():
+                return Response(b"".join(frame['binary'] for frame in frames), mimetype=BINARY_MIMETYPE)
+
+            result = {'message': f'Model updated to step {currentStep}.', 'currentStep':currentStep}
+            if sendFrames:
+                result['frames'] = [frame['json'] for frame in frames]
+            return jsonify(result)
         except Exception as e:
             print(e)
             return jsonify({"message": "Error during step."}), 500
 
+def streamEvent(frame):
+    """Frame as a server-sent event, with the step as the event id."""
+    return f"id: {frame['currentStep']}\ndata: {json.dumps(frame)}\n\n"
+
+# This route streams the simulation as server-sent events, one JSON frame per step.
+# The first event is a full snapshot, the next ones are the delta frames of /update?frames=true.
+# ?interval=<ms> sets the minimum time between steps and ?steps=<n> ends the stream after n steps.
+# With ?window=<n> the server stops n steps ahead of the last step acknowledged with /stream/ack,
+# so a slow client slows the simulation down instead of piling frames up in the socket buffers.
+@app.route('/stream', methods=['GET'])
+@cross_origin()
+def streamModel():
+    global currentStep, randomModel, streamAck
+    interval = max(0, request.args.get('interval', default=0, type=int)) / 1000
+    maxSteps = request.args.get('steps', default=None, type=int)
+    window = request.args.get('window', default=None, type=int)
+
+    def generate():
+        global currentStep, streamAck
+        model = randomModel
+        with streamCondition:
+            streamAck = changeLog.step
+        yield streamEvent(positionFrame(changeLog.step, True, changeLog.positions))
+
+        sent = 0
+        nextTime = time.perf_counter()
+        while maxSteps is None or sent < maxSteps:
+            if window is not None:
+                with streamCondition:
+                    streamCondition.wait_for(
+                        lambda: currentStep - streamAck < window or randomModel is not model
+                    )
+
+            # A new /init ends the stream, the client has to open a new one
+            if randomModel is not model:
+                return
+
+            nextTime += interval
+            delay = nextTime - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+
+            frame = nextFrame()
+            currentStep = frame['step']
+            if 'json' not in frame:
+                serialiseFrame(frame)
+            yield streamEvent(frame['json'])
+            sent += 1
+
+    try:
+        return Response(generate(), mimetype='text/event-stream', headers={'Cache-Control': 'no-cache'})
+    except Exception as e:
+        print(e)
+        return jsonify({"message": "Error starting the stream."}), 500
+
+# This route is used by the stream client to tell the last step it has processed
+@app.route('/stream/ack', methods=['GET'])
+@cross_origin()
+def streamAcknowledge():
+    global streamAck
+    try:
+        step = request.args.get('step', type=int)
+        with streamCondition:
+            streamAck = max(streamAck, step)
+            streamCondition.notify_all()
+        return jsonify({'currentStep': currentStep, 'acknowledged': streamAck})
+    except Exception as e:
+        print(e)
+        return jsonify({"message": "Error acknowledging the step."}), 500
 
 if __name__=='__main__':
     # Run the flask server in port 8585
@@ -0,0 +1,92 @@
+from collections import deque
+
+
+class ChangeLog:
+    """
+    Per-step log of the agents that moved, spawned or were removed.
+    Lets the server answer with only what changed since the client's last step.
+    Attributes:
+        positions: Current {id: (x, z)} of the tracked agents
+        step: Last recorded step
+    """
+    def __init__(self, snapshot, step=0, max_steps=100):
+        """
+        Creates the log from the current state of the model.
+        Args:
+            snapshot: Function that returns the current {id: (x, z)} of the tracked agents
+            step: Step of the current state
+            max_steps: Number of steps kept. Clients further behind get a full snapshot
+        """
+        self.snapshot = snapshot
+        self.positions = snapshot()
+        self.step = step
+        # Each entry is (step, {id: (x, z)} of moved or spawned agents, [removed ids])
+        self.entries = deque(maxlen=max_steps)
+
+    def record(self, step):
+        """
+        Stores the changes between the last recorded state and the current one.
+        Args:
+            step: Step the model is at now
+        Returns:
+            tuple: ({id: (x, z)} of moved or spawned agents, [removed ids])
+        """
+        positions = self.snapshot()
+        changed = {
+            agent_id: position
+            for agent_id, position in positions.items()
+            if self.positions.get(agent_id) != position
+        }
+        removed = [agent_id for agent_id in self.positions if agent_id not in positions]
+
+        self.entries.append((step, changed, removed))
+        self.positions = positions
+        self.step = step
+        return changed, removed
+
+    def apply(self, step, changed, removed):
+        """
+        Stores changes computed elsewhere, e.g. by the log of a background simulation.
+        Args:
+            step: Step of the changes
+            changed: {id: (x, z)} of moved or spawned agents
+            removed: Ids of the removed agents
+        """
+        # A new dictionary, so the positions read by a request never change while it reads them
+        positions = {**self.positions, **changed}
+        for agent_id in removed:
+            positions.pop(agent_id, None)
+
+        self.entries.append((step, changed, removed))
+        self.positions = positions
+        self.step = step
+
+    def since(self, step):
+        """
+        Changes between step and the last recorded step.
+        Args:
+            step: Last step the client has
+        Returns:
+            tuple: ({id: (x, z)} of moved or spawned agents, [removed ids]),
+                   or None if the log does not reach back to step
+        """
+        if step == self.step:
+            return {}, []
+
+        # A client ahead of the log belongs to an older model, one too far behind missed entries
+        if step > self.step or not self.entries or step < self.entries[0][0] - 1:
+            return None
+
+        changed = {}
+        removed = set()
+        for entry_step, entry_changed, entry_removed in self.entries:
+            if entry_step <= step:
+                continue
+            for agent_id in entry_removed:
+                changed.pop(agent_id, None)
+                removed.add(agent_id)
+            for agent_id, position in entry_changed.items():
+                changed[agent_id] = position
+                removed.discard(agent_id)
+
+        return changed, sorted(removed)
@@ -0,0 +1,39 @@
+import numpy as np
+
+BINARY_MIMETYPE = "application/octet-stream"
+
+# Header: currentStep, full (0 or 1), number of positions, number of removed ids
+HEADER = np.dtype("<i4")
+HEADER_SIZE = 4
+
+
+def pack_positions(step, full, positions, removed=()):
+    """
+    Packs agent positions as little-endian binary, so the client can wrap
+    the arrays in typed arrays without parsing.
+    Layout, every value is 4 bytes:
+        int32 header[4]: step, full, n, number of removed ids
+        int32 ids[n]
+        float32 xyz[3 * n]: x, y, z of each agent, y is always 1
+        int32 removed[number of removed ids]
+    Args:
+        step: Step of the positions
+        full: Whether the positions are a full snapshot or only the changes
+        positions: {id: (x, z)} with numeric ids
+        removed: Ids of the removed agents
+    Returns:
+        bytes: The packed payload
+    """
+    n = len(positions)
+    header = np.array([step, int(full), n, len(removed)], dtype=HEADER)
+    ids = np.fromiter((int(agent_id) for agent_id in positions), dtype="<i4", count=n)
+
+    xyz = np.ones((n, 3), dtype="<f4")
+    if n:
+        xyz[:, [0, 2]] = np.fromiter(
+            (value for coordinate in positions.values() for value in coordinate),
+            dtype="<f4", count=2 * n,
+        ).reshape(n, 2)
+
+    removed_ids = np.fromiter((int(agent_id) for agent_id in removed), dtype="<i4", count=len(removed))
+    return b"".join((header.tobytes(), ids.tobytes(), xyz.tobytes(), removed_ids.tobytes()))
@@ -0,0 +1,75 @@
+import threading
+from collections import deque
+
+
+class SimulationWorker:
+    """
+    Runs a simulation in a background thread, staying a fixed number of steps
+    ahead of the client. The frames of the steps wait in a bounded buffer until
+    they are popped, and the thread pauses while the buffer is full.
+    Attributes:
+        lead: Maximum number of frames computed ahead of the client
+        error: Exception raised by advance, if the simulation failed
+    """
+    def __init__(self, advance, lead=20):
+        """
+        Creates the worker and starts its thread.
+        Args:
+            advance: Function that advances the simulation one step and returns its frame
+            lead: Maximum number of frames computed ahead of the client
+        """
+        self.advance = advance
+        self.lead = lead
+        self.frames = deque()
+        self.error = None
+        self.running = True
+        self.condition = threading.Condition()
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def run(self):
+        """Computes frames until stopped, waiting while the buffer is full."""
+        while True:
+            with self.condition:
+                while self.running and len(self.frames) >= self.lead:
+                    self.condition.wait()
+                if not self.running:
+                    return
+
+            # The step runs outside the lock so that popping never waits for it
+            try:
+                frame = self.advance()
+            except Exception as e:
+                with self.condition:
+                    self.error = e
+                    self.running = False
+                    self.condition.notify_all()
+                return
+
+            with self.condition:
+                self.frames.append(frame)
+                self.condition.notify_all()
+
+    def pop(self, timeout=None):
+        """
+        Takes the oldest frame, waiting for the thread if none is ready.
+        Args:
+            timeout: Maximum seconds to wait (default: no limit)
+        Returns:
+            The frame, or None if none was ready before the timeout
+        """
+        with self.condition:
+            if not self.condition.wait_for(lambda: self.frames or not self.running, timeout):
+                return None
+            if not self.frames:
+                raise RuntimeError("The simulation worker stopped") from self.error
+            frame = self.frames.popleft()
+            self.condition.notify_all()
+            return frame
+
+    def stop(self):
+        """Stops the thread after the step it is computing, if any."""
+        with self.condition:
+            self.running = False
+            self.condition.notify_all()
+        self.thread.join()
@@ -0,0 +1,77 @@
+"""
+Python client for the /stream endpoint of agents_server.py.
+
+Example:
+    for frame in read_frames("http://localhost:8585/", window=5):
+        print(frame["currentStep"], len(frame["positions"]))
+"""
+import json
+from urllib.parse import urlencode
+from urllib.request import urlopen
+
+
+def parse_events(lines):
+    """
+    Reads server-sent events from an iterable of text lines.
+    Returns:
+        generator: The data of each event, decoded from JSON
+    """
+    data = []
+    for line in lines:
+        line = line.rstrip("\r\n")
+        if not line:
+            # An empty line ends the event
+            if data:
+                yield json.loads("\n".join(data))
+                data = []
+        elif line.startswith("data:"):
+            data.append(line[5:].lstrip())
+
+    if data:
+        yield json.loads("\n".join(data))
+
+
+def read_frames(server, window=None, interval=None, steps=None, timeout=None):
+    """
+    Opens the /stream of a server and yields its frames as they arrive.
+    Args:
+        server: Base URL of the server, e.g. "http://localhost:8585/"
+        window: Steps the server may compute ahead of the last frame read (default: no limit)
+        interval: Minimum milliseconds between steps
+        steps: Number of steps after which the stream ends
+        timeout: Socket timeout in seconds
+    With a window, the frames are acknowledged every half window, after the loop
+    body is done with them, so a slow loop over the frames also slows the simulation down.
+    """
+    params = {name: value for name, value in
+              (("window", window), ("interval", interval), ("steps", steps)) if value is not None}
+    url = server.rstrip("/") + "/stream"
+    if params:
+        url += "?" + urlencode(params)
+
+    acknowledged = None
+    with urlopen(url, timeout=timeout) as response:
+        for frame in parse_events(line.decode() for line in response):
+            yield frame
+            step = frame["currentStep"]
+            if window is not None and (acknowledged is None or step - acknowledged >= max(1, window // 2)):
+                urlopen(f"{server.rstrip('/')}/stream/ack?step={step}", timeout=timeout).close()
+                acknowledged = step
+
+
+class Positions:
+    """Agent positions kept up to date with the frames of a stream."""
+    def __init__(self):
+        self.positions = {}
+        self.step = None
+
+    def apply(self, frame):
+        """Applies a full or delta frame. Returns the positions after it."""
+        if frame["full"]:
+            self.positions = {}
+        for agent_id in frame.get("removed", []):
+            self.positions.pop(agent_id, None)
+        for position in frame["positions"]:
+            self.positions[position["id"]] = (position["x"], position["z"])
+        self.step = frame["currentStep"]
+        return self.positions
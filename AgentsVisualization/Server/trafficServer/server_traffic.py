@@ -6,7 +6,8 @@ from flask import Flask, request, jsonify
 #from randomAgents.model import RandomModel
 #from randomAgents.agent import RandomAgent, ObstacleAgent
 from trafficBase.model import CityModel
-from trafficBase.agent import Road, Traffic_Light, Obstacle, Destination
+from trafficBase.agent import Car, Road, Traffic_Light, Obstacle, Destination
+from simulation_worker import SimulationWorker
 
 # Size of the board:
 number_agents = 10
@@ -14,6 +15,11 @@ width = 28
 height = 28
 randomModel = None
 currentStep = 0
+# Background simulation: number of steps computed ahead of the client (0 runs each step inside /update)
+background_steps = 0
+worker = None
+# Frame of the last step sent to the client
+currentFrame = None
 
 # This application will be used to interact with Unity
 app = Flask("Traffic example")
@@ -22,33 +28,30 @@ app = Flask("Traffic example")
 # The servers expects a POST request with the parameters in a form.
 @app.route('/init', methods=['POST'])
 def initModel():
-    global currentStep, randomModel, number_agents, width, height
+    global currentStep, randomModel, number_agents, width, height, background_steps, worker, currentFrame
 
     if request.method == 'POST':
         number_agents = int(request.form.get('NAgents'))
+        background_steps = int(request.form.get('backgroundSteps', 0))
         currentStep = 0
 
         print(request.form)
 
+        if worker is not None:
+            worker.stop()
+            worker = None
+
         # Create the model using the parameters sent by Unity
         randomModel = CityModel(number_agents)
+        currentFrame = carFrame(randomModel, currentStep)
+
+        if background_steps > 0:
+            model = randomModel
+            worker = SimulationWorker(lambda: simulateStep(model), background_steps)
 
         # Return a message to Unity saying that the model was created successfully
         return jsonify({"message":"Parameters recieved, model initiated."})
 
-# This route will be used to get the positions of the agents
-#@app.route('/getAgents', methods=['GET'])
-#def getAgents():
-    #global randomModel
-
-    #if request.method == 'GET':
-        ## Get the positions of the agents and return them to Unity in JSON format.
-        ## Note that the positions are sent as a list of dictionaries, where each dictionary has the id and position of an agent.
-        ## The y coordinate is set to 1, since the agents are in a 3D world. The z coordinate corresponds to the row (y coordinate) of the grid in mesa.
-        #agentPositions = [{"id": str(a.unique_id), "x": x, "y":1, "z":z} for a, (x, z) in randomModel.grid.coord_iter() if isinstance(a, RandomAgent)]
-
-        #return jsonify({'positions':agentPositions})
-
 ## This route will be used to get the positions of the obstacles
 #@app.route('/getObstacles', methods=['GET'])
 #def getObstacles():
@@ -61,15 +64,39 @@ def initModel():
 
         #return jsonify({'positions':carPositions})
 
-## This route will be used to update the model
-#@app.route('/update', methods=['GET'])
-#def updateModel():
-    #global currentStep, randomModel
-    #if request.method == 'GET':
-        ## Update the model and return a message to Unity saying that the model was updated successfully
-        #randomModel.step()
-        #currentStep += 1
-        #return jsonify({'message':f'Model updated to step {currentStep}.', 'currentStep':currentStep})
+def carFrame(model, step):
+    """Positions of the cars at a step, ready to send."""
+    carPositions = [
+        {"id": str(a.unique_id), "x": a.pos[0], "y":1, "z":a.pos[1]}
+        for a in model.schedule.agents if isinstance(a, Car)
+    ]
+    return {'positions': carPositions, 'currentStep': step}
+
+def simulateStep(model):
+    """Advances the model one step and returns the frame of the new step."""
+    model.step()
+    return carFrame(model, model.schedule.steps)
+
+# This route will be used to get the positions of the cars in the last step sent with /update
+@app.route('/getAgents', methods=['GET'])
+def getAgents():
+    if request.method == 'GET':
+        return jsonify(currentFrame)
+
+# This route will be used to update the model
+# When the model runs in a background worker (backgroundSteps in /init), the step is
+# taken from the frames it already computed.
+@app.route('/update', methods=['GET'])
+def updateModel():
+    global currentStep, randomModel, currentFrame
+    if request.method == 'GET':
+        # Update the model and return a message to Unity saying that the model was updated successfully
+        if worker is None:
+            currentFrame = simulateStep(randomModel)
+        else:
+            currentFrame = worker.pop()
+        currentStep += 1
+        return jsonify({'message':f'Model updated to step {currentStep}.', 'currentStep':currentStep})
 
 if __name__=='__main__':
     # Run the flask server in port 8585
@@ -17,6 +17,24 @@ const agent_server_uri = "http://localhost:8585/";
 const agents = [];
 const obstacles = [];
 
+// Last step received from the server, used to ask only for the changes since then
+let lastStep = -1;
+
+// Ask for the agent positions as packed binary arrays instead of JSON
+const binaryPositions = true;
+
+// Number of steps the server computes per /update request, and the frames waiting to be shown
+const stepsPerUpdate = 10;
+const pendingFrames = [];
+let framesRequest = null;
+
+// Receive the steps as server-sent events from /stream instead of requesting them with /update.
+// The server stays at most streamWindow steps ahead of the last step acknowledged.
+const streamFrames = false;
+const streamWindow = 10;
+let eventSource = null;
+let acknowledgedStep = 0;
+
 // Define the data object
 const initData = {
     NAgents: 20,
@@ -44,6 +62,9 @@ async function initAgentsModel() {
             // Parse the response as JSON and log the message
             let result = await response.json();
             console.log(result.message);
+            lastStep = -1;
+            pendingFrames.length = 0;
+            acknowledgedStep = 0;
         }
 
     } catch (error) {
@@ -58,46 +79,28 @@ async function initAgentsModel() {
 async function getAgents() {
     try {
         // Send a GET request to the agent server to retrieve the agent positions
-        let response = await fetch(agent_server_uri + "getAgents");
+        // After the first request, only the changes since the last step are requested
+        const query = lastStep >= 0 ? `?since=${lastStep}` : "";
+        const accept = binaryPositions ? "application/octet-stream" : "application/json";
+        let response = await fetch(agent_server_uri + "getAgents" + query, {
+            headers: { 'Accept': accept }
+        });
 
         // Check if the response was successful
         if (response.ok) {
-            // Parse the response as JSON
-            let result = await response.json();
+            let frame;
+            if (binaryPositions) {
+                // Wrap the binary payload in typed arrays, no parsing needed
+                frame = decodeFrame(await response.arrayBuffer()).frame;
+            } else {
+                // Parse the response as JSON
+                frame = jsonFrame(await response.json());
+            }
 
             // Log the agent positions
-            //console.log("getAgents positions: ", result.positions)
-
-            // Check if the agents array is empty
-            if (agents.length == 0) {
-                // Create new agents and add them to the agents array
-                for (const agent of result.positions) {
-                    const newAgent = new Object3D(agent.id, [agent.x, agent.y, agent.z]);
-                    // Store the initial position
-                    newAgent['oldPosArray'] = newAgent.posArray;
-                    agents.push(newAgent);
-                }
-                // Log the agents array
-                //console.log("Agents:", agents);
+            //console.log("getAgents frame: ", frame)
 
-            } else {
-                // Update the positions of existing agents
-                for (const agent of result.positions) {
-                    //Sincronizacion agente mesa con agente webgl
-                    const current_agent = agents.find((object3d) => object3d.id == agent.id);
-
-                    // Check if the agent exists in the agents array
-                    //Modificar para permitir que se creen nuevos agentes que no estaban en el array
-                    if(current_agent != undefined){
-                        // Update the agent's position
-                        current_agent.oldPosArray = current_agent.posArray;
-                        current_agent.position = {x: agent.x, y: agent.y, z: agent.z};
-                    }
-
-                    //console.log("OLD: ", current_agent.oldPosArray,
-                    //            " NEW: ", current_agent.posArray);
-                }
-            }
+            applyFrame(frame);
         }
 
     } catch (error) {
@@ -106,6 +109,95 @@ async function getAgents() {
     }
 }
 
+/*
+ * Reads a binary frame sent by the server, starting at offset bytes.
+ * Layout (all values are 4 bytes, little-endian):
+ * int32 header [step, full, n, removed], int32 ids[n], float32 xyz[3n], int32 removed[]
+ * Returns the frame and its length in bytes.
+ */
+function decodeFrame(buffer, offset = 0) {
+    const header = new Int32Array(buffer, offset, 4);
+    const n = header[2];
+    const numRemoved = header[3];
+    let position = offset + 16;
+
+    const ids = new Int32Array(buffer, position, n);
+    position += 4 * n;
+    const xyz = new Float32Array(buffer, position, 3 * n);
+    position += 12 * n;
+    const removed = new Int32Array(buffer, position, numRemoved);
+    position += 4 * numRemoved;
+
+    const frame = {
+        currentStep: header[0],
+        full: header[1] == 1,
+        // Ids are strings in the Object3D array
+        ids: Array.from(ids, String),
+        xyz: xyz,
+        removed: Array.from(removed, String)
+    };
+    return { frame: frame, byteLength: position - offset };
+}
+
+/*
+ * Converts a JSON frame from the server to the same form decodeFrame returns.
+ */
+function jsonFrame(result) {
+    return {
+        currentStep: result.currentStep,
+        full: result.full,
+        ids: result.positions.map((agent) => agent.id),
+        xyz: result.positions.flatMap((agent) => [agent.x, agent.y, agent.z]),
+        removed: result.removed ?? []
+    };
+}
+
+/*
+ * Applies a frame of positions to the agents array.
+ * New ids create agents, and a full frame removes the agents it does not contain.
+ */
+function applyFrame(frame) {
+    // A full snapshot replaces the agents that are no longer in the simulation
+    if (frame.full) {
+        const ids = new Set(frame.ids);
+        removeAgents(agents.filter((object3d) => !ids.has(object3d.id)).map((object3d) => object3d.id));
+    } else {
+        removeAgents(frame.removed);
+    }
+
+    for (let i = 0; i < frame.ids.length; i++) {
+        const position = {x: frame.xyz[3 * i], y: frame.xyz[3 * i + 1], z: frame.xyz[3 * i + 2]};
+
+        //Sincronizacion agente mesa con agente webgl
+        const current_agent = agents.find((object3d) => object3d.id == frame.ids[i]);
+
+        if (current_agent != undefined) {
+            // Update the agent's position
+            current_agent.oldPosArray = current_agent.posArray;
+            current_agent.position = position;
+        } else {
+            // Create the agents that were not in the array
+            const newAgent = new Object3D(frame.ids[i], [position.x, position.y, position.z]);
+            // Store the initial position
+            newAgent['oldPosArray'] = newAgent.posArray;
+            agents.push(newAgent);
+        }
+    }
+    lastStep = frame.currentStep;
+}
+
+/*
+ * Removes the agents with the given ids from the agents array.
+ */
+function removeAgents(ids) {
+    for (const id of ids) {
+        const index = agents.findIndex((object3d) => object3d.id == id);
+        if (index != -1) {
+            agents.splice(index, 1);
+        }
+    }
+}
+
 /*
  * Retrieves the current positions of all obstacles from the agent server.
  */
@@ -135,20 +227,33 @@ async function getObstacles() {
 }
 
 /*
- * Updates the agent positions by sending a request to the agent server.
+ * Asks the server for the next batch of steps, and stores their frames in pendingFrames.
  */
-async function update() {
-    //Esencialmente llama al step del modelo
+async function fetchFrames() {
     try {
-        // Send a request to the agent server to update the agent positions
-        let response = await fetch(agent_server_uri + "update");
+        // Send a request to the agent server to advance several steps and return their frames
+        const accept = binaryPositions ? "application/octet-stream" : "application/json";
+        let response = await fetch(agent_server_uri + `update?steps=${stepsPerUpdate}&frames=true`, {
+            headers: { 'Accept': accept }
+        });
 
         // Check if the response was successful
         if (response.ok) {
-            // Retrieve the updated agent positions -> NUEVAS POSICIONES
-            await getAgents();
-            // Log a message indicating that the agents have been updated
-            //console.log("Updated agents");
+            if (binaryPositions) {
+                // The binary frames come one after the other
+                const buffer = await response.arrayBuffer();
+                let offset = 0;
+                while (offset < buffer.byteLength) {
+                    const decoded = decodeFrame(buffer, offset);
+                    pendingFrames.push(decoded.frame);
+                    offset += decoded.byteLength;
+                }
+            } else {
+                let result = await response.json();
+                for (const frame of result.frames) {
+                    pendingFrames.push(jsonFrame(frame));
+                }
+            }
         }
 
     } catch (error) {
@@ -157,4 +262,68 @@ async function update() {
     }
 }
 
+/*
+ * Updates the agent positions with the next step of the simulation.
+ * Steps are requested in batches, and the next batch is requested while
+ * half of the current one is still left to play.
+ */
+async function update() {
+    //Esencialmente llama al step del modelo
+    if (streamFrames) {
+        playStreamFrame();
+        return;
+    }
+
+    if (pendingFrames.length <= stepsPerUpdate / 2 && framesRequest == null) {
+        framesRequest = fetchFrames().finally(() => { framesRequest = null; });
+    }
+
+    // Only wait for the server when there are no frames left
+    if (pendingFrames.length == 0) {
+        await framesRequest;
+    }
+
+    const frame = pendingFrames.shift();
+    if (frame != undefined) {
+        // Apply the new positions -> NUEVAS POSICIONES
+        applyFrame(frame);
+    }
+}
+
+/*
+ * Opens the stream of frames. The frames wait in pendingFrames until update() plays them.
+ * The browser reconnects by itself when the stream ends, and the new stream starts with a full frame.
+ */
+function startStream() {
+    eventSource = new EventSource(agent_server_uri + `stream?window=${streamWindow}`);
+    eventSource.onmessage = (event) => {
+        pendingFrames.push(jsonFrame(JSON.parse(event.data)));
+    };
+    eventSource.onerror = (error) => {
+        console.log(error);
+    };
+}
+
+/*
+ * Plays the next frame of the stream, and acknowledges the steps played
+ * every half window so the server can keep computing.
+ */
+function playStreamFrame() {
+    if (eventSource == null) {
+        startStream();
+    }
+
+    const frame = pendingFrames.shift();
+    if (frame == undefined) {
+        return;
+    }
+    applyFrame(frame);
+
+    if (frame.full || frame.currentStep - acknowledgedStep >= streamWindow / 2) {
+        acknowledgedStep = frame.currentStep;
+        fetch(agent_server_uri + `stream/ack?step=${acknowledgedStep}`)
+            .catch((error) => console.log(error));
+    }
+}
+
 export { agents, obstacles, initAgentsModel, update, getAgents, getObstacles };
@@ -0,0 +1,184 @@
+"""
+Benchmark of the roomba simulation across floor and fleet sizes.
+
+Times the construction and a fixed number of steps of RandomModel for every
+combination of the given parameters. Each step is split in its phases
+(agent step, data collection, completion check), and the peak memory of
+construction plus steps is measured in a second run with tracemalloc.
+Results are written as JSON, tagged with the current git commit, so runs
+from different commits can be compared with --compare.
+
+Example:
+    python benchmark.py --size 20 50 100 200 500 --num-agents 5 20 --output bench.json
+    python benchmark.py --compare bench_before.json bench.json
+"""
+import argparse
+import itertools
+import json
+import platform
+import subprocess
+import time
+import tracemalloc
+from collections import defaultdict
+
+from random_agents.model import RandomModel
+
+CASE_FIELDS = ["engine", "width", "height", "num_agents", "dirty_percentage", "obstacle_percentage", "steps"]
+
+
+def git_commit():
+    """Current git commit, or None outside of a repository."""
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def make_model(case, seed):
+    """Create the model of a benchmark case. max_steps never stops the run early."""
+    return RandomModel(
+        simulation_mode=2,
+        num_agents=case["num_agents"],
+        width=case["width"],
+        height=case["height"],
+        seed=seed,
+        max_steps=case["steps"] + 1,
+        dirty_percentage=case["dirty_percentage"],
+        obstacle_percentage=case["obstacle_percentage"],
+        engine=case["engine"],
+    )
+
+
+def timed(function, phase, phases):
+    """Wrap function so that its run time is added to phases[phase]."""
+    def wrapper(*args, **kwargs):
+        start = time.perf_counter()
+        result = function(*args, **kwargs)
+        phases[phase] += time.perf_counter() - start
+        return result
+    return wrapper
+
+
+def run_case(case, seed=42):
+    """
+    Benchmark one case.
+    Args:
+        case: Dictionary with the CASE_FIELDS values
+        seed: Random seed of the model
+    Returns:
+        dict: The case plus construction time, step times and peak memory
+    """
+    start = time.perf_counter()
+    model = make_model(case, seed)
+    construct = time.perf_counter() - start
+
+    # Time each phase of RandomModel.step by wrapping it on this instance
+    phases = defaultdict(float)
+    model.step_agents = timed(model.step_agents, "agents", phases)
+    model.datacollector.collect = timed(model.datacollector.collect, "data_collection", phases)
+    model.check_completion = timed(model.check_completion, "completion_check", phases)
+
+    # The steps run even if the floor gets clean, so every commit does the same work
+    start = time.perf_counter()
+    for _ in range(case["steps"]):
+        model.step()
+    steps_time = time.perf_counter() - start
+
+    # Second run for the memory, tracemalloc slows everything down
+    tracemalloc.start()
+    model = make_model(case, seed)
+    for _ in range(case["steps"]):
+        model.step()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {
+        **case,
+        "construct_s": construct,
+        "steps_s": steps_time,
+        "steps_per_s": case["steps"] / steps_time if steps_time else None,
+        "phases_s": dict(phases),
+        "peak_memory_mb": peak / 2**20,
+    }
+
+
+def benchmark(cases, seed=42):
+    """Run every case, printing a line per case."""
+    results = []
+    for case in cases:
+        result = run_case(case, seed)
+        results.append(result)
+        print(
+            f"{case['engine']:>10} {case['width']}x{case['height']} agents={case['num_agents']} "
+            f"dirty={case['dirty_percentage']} obs={case['obstacle_percentage']}: "
+            f"construct {result['construct_s']:.3f}s, {result['steps_per_s']:.1f} steps/s, "
+            f"peak {result['peak_memory_mb']:.1f} MB"
+        )
+    return results
+
+
+def case_key(result):
+    return tuple(result[field] for field in CASE_FIELDS)
+
+
+def compare(before_path, after_path):
+    """Print the speed up of every case present in both benchmark files."""
+    with open(before_path) as before_file, open(after_path) as after_file:
+        before = json.load(before_file)
+        after = json.load(after_file)
+
+    previous = {case_key(result): result for result in before["results"]}
+    print(f"{before.get('commit')} -> {after.get('commit')}")
+
+    for result in after["results"]:
+        old = previous.get(case_key(result))
+        if old is None:
+            continue
+        construct = old["construct_s"] / result["construct_s"]
+        steps = old["steps_s"] / result["steps_s"]
+        memory = result["peak_memory_mb"] / old["peak_memory_mb"]
+        print(
+            f"{result['engine']:>10} {result['width']}x{result['height']} agents={result['num_agents']}: "
+            f"construct x{construct:.2f}, steps x{steps:.2f}, memory x{memory:.2f}"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark of the roomba simulation")
+    parser.add_argument("--size", type=int, nargs="+", default=[20, 50, 100, 200, 500], help="Square grid sizes")
+    parser.add_argument("--num-agents", type=int, nargs="+", default=[5, 20])
+    parser.add_argument("--dirty", type=float, nargs="+", default=[0.2])
+    parser.add_argument("--obstacles", type=float, nargs="+", default=[0.1])
+    parser.add_argument("--engine", nargs="+", choices=["agents", "vectorized"], default=["agents"])
+    parser.add_argument("--steps", type=int, default=100)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", default="benchmark.json")
+    parser.add_argument("--compare", nargs=2, metavar=("BEFORE", "AFTER"), help="Compare two benchmark files")
+    args = parser.parse_args()
+
+    if args.compare:
+        compare(*args.compare)
+        return
+
+    cases = [
+        dict(zip(CASE_FIELDS, (engine, size, size, agents, dirty, obstacles, args.steps)))
+        for engine, size, agents, dirty, obstacles in itertools.product(
+            args.engine, args.size, args.num_agents, args.dirty, args.obstacles
+        )
+    ]
+    results = benchmark(cases, args.seed)
+
+    with open(args.output, "w") as output:
+        json.dump({
+            "commit": git_commit(),
+            "python": platform.python_version(),
+            "seed": args.seed,
+            "results": results,
+        }, output, indent=2)
+    print(f"Results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,14 @@
 #Uso de IA: Uso para complementar comentarios y completarlos, además de guía en la implementación del BFS y del menú para agregar ambas simulaciones
 from mesa.discrete_space import CellAgent, FixedAgent
 from collections import deque
+import numpy as np
+
+from .path_planner import find_path
+
+# Flags stored in the floor property layer of RandomModel
+OBSTACLE = np.uint8(1)
+TRASH = np.uint8(2)
+STATION = np.uint8(4)
 
 class RandomAgent(CellAgent):
     """
@@ -10,14 +18,14 @@ class RandomAgent(CellAgent):
         cell: Current grid position
         energy: Battery level (0-100)
         home_station: Assigned charging station
-        path_station: BFS path to charging station
         distance_station: Steps to reach charging station
         returning: Flag indicating return to station
         moves_count: Total movements made
         returning_to_work: Flag for returning to work area
         work_position: Last work position before charging
-        path_to_work: BFS path back to work position
+        path_to_work: A* path (deque) back to work position
         waiting_station: Flag for waiting at occupied station
+        queued_station: Station whose queue the roomba is waiting in
     """
     def __init__(self, model, cell, energy=100, home_station= None):
         """
@@ -30,78 +38,69 @@ class RandomAgent(CellAgent):
         """
         super().__init__(model)
         self.cell = cell
+        self._energy= 0
+        self._moves_count= 0
         self.energy= energy
         self.home_station= home_station
-        self.path_station=[]
+        # Set by RandomModel.update_station_fields once the obstacles are placed
         self.distance_station=0
         self.returning=False
         self.moves_count = 0
         self.returning_to_work = False
         self.work_position = None
-        self.path_to_work = []
+        self.path_to_work = deque()
         self.waiting_station=False
+        self.queued_station= None
         self.initial_trash_count= 0
 
-        if self.home_station:
-            self.calculate_path_station()
-    
-    def calculate_path_station(self):
+        self.model.roomba_count += 1
+
+    @property
+    def energy(self):
+        """Battery level, mirrored into the model's total_energy counter"""
+        return self._energy
+
+    @energy.setter
+    def energy(self, value):
+        self.model.total_energy += value - self._energy
+        self._energy = value
+
+    @property
+    def moves_count(self):
+        """Movements made, mirrored into the model's total_moves counter"""
+        return self._moves_count
+
+    @moves_count.setter
+    def moves_count(self, value):
+        self.model.total_moves += value - self._moves_count
+        self._moves_count = value
+
+    def remove(self):
+        """Remove the roomba and take it out of the model counters"""
+        self.model.roomba_count -= 1
+        self.model.total_energy -= self._energy
+        self.model.total_moves -= self._moves_count
+        super().remove()
+
+    def update_distance_station(self):
         """
-        Calculate shortest path to home charging station using BFS.
-        Updates path_station and distance_station attributes.
+        Look up the distance to the home charging station.
+        Uses the distance field precomputed by the station.
         """
         if not self.home_station:
             self.distance_station= float('inf')
             return
-        
-        target= self.home_station.cell
-        queue= deque([(self.cell, [self.cell])])
-        visited= {self.cell}
-
-        while queue:
-            current_cell, path= queue.popleft()
 
-            # Check if reached target station
-            if current_cell == target:
-                self.path_station = path[1:]  # Exclude current cell
-                self.distance_station = len(path) - 1
-                return
-            
-            # Explore neighbors
-            for neighbor in current_cell.neighborhood:
-                if neighbor not in visited:
-                    obstacle= any(isinstance(obj, ObstacleAgent) for obj in neighbor.agents)
-                    if not obstacle:
-                        visited.add(neighbor)
-                        queue.append((neighbor, path + [neighbor]))
-
-        self.distance_station= float('inf')
-        self.path_station= []
+        self.distance_station= self.home_station.distance_from(self.cell)
 
     def calculate_path_to_work(self):
-        """Calculate path back to work position using BFS"""
+        """Calculate path back to work position using A*"""
         if not self.work_position:
             return
-        
-        target = self.work_position
-        queue = deque([(self.cell, [self.cell])])
-        visited = {self.cell}
-
-        while queue:
-            current_cell, path = queue.popleft()
 
-            if current_cell == target:
-                self.path_to_work = path[1:]
-                return
-            
-            for neighbor in current_cell.neighborhood:
-                if neighbor not in visited:
-                    obstacle = any(isinstance(obj, ObstacleAgent) for obj in neighbor.agents)
-                    if not obstacle:
-                        visited.add(neighbor)
-                        queue.append((neighbor, path + [neighbor]))
-
-        self.path_to_work = []
+        self.path_to_work = find_path(
+            self.cell, self.work_position, lambda cell: not cell.floor & OBSTACLE
+        )
 
     def move(self):
         """
@@ -111,47 +110,42 @@ class RandomAgent(CellAgent):
         
         if self.random.random() < 0.5 and self.energy>0:
             # Checks which cells around have trash
-            cells_trash=[]
-            for cell in self.cell.neighborhood:
-                obstacle= any(isinstance(obj, ObstacleAgent) for obj in cell.agents)
-                trash= any(isinstance(obj, Trash) for obj in cell.agents)
-
-                if not obstacle and trash:
-                    cells_trash.append(cell)
+            cells_trash=[
+                cell for cell in self.cell.neighborhood
+                if cell.floor & TRASH and not cell.floor & OBSTACLE
+            ]
             
             #Choose randomly between trash cells
             if cells_trash:
                 self.cell = self.random.choice(cells_trash)
                 self.energy -= 1
                 self.moves_count += 1
-                self.calculate_path_station()
+                self.update_distance_station()
                 return 
             
             #If no trash around, move randomly
             next_moves = self.cell.neighborhood.select(
-                lambda cell: all(not isinstance(obj, ObstacleAgent) for obj in cell.agents)
+                lambda cell: not cell.floor & OBSTACLE
             )
 
             if next_moves:
                 self.cell = next_moves.select_random_cell()
                 self.energy -= 1
                 self.moves_count += 1
-                self.calculate_path_station()
+                self.update_distance_station()
     
     def move_station(self):
         """Move towards charging station"""
         # Check for nearby stations in order to reduce the time
-        stations_here= [obj for obj in self.cell.agents if isinstance(obj, Station)]
-
-        if stations_here:
+        if self.cell.floor & STATION:
             self.waiting_station=True
             self.returning=False
             return True
 
         # Check for stations in immediate neighborhood (opportunistic)
         for cell in self.cell.neighborhood:
-            if any(isinstance(obj,Station) for obj in cell.agents):
-                if not any(isinstance(obj, ObstacleAgent) for obj in cell.agents):
+            if cell.floor & STATION:
+                if not cell.floor & OBSTACLE:
                     self.cell = cell
                     self.energy -= 1
                     self.moves_count += 1
@@ -159,19 +153,19 @@ class RandomAgent(CellAgent):
                     self.waiting_station=True
                     return True
         
-        # Follow calculated path
-        if self.path_station:
-            next_cell= self.path_station[0]
-            if not any(isinstance(obj, ObstacleAgent) for obj in next_cell.agents):
+        # Follow the station's distance field
+        next_cell= self.home_station.next_hop_from(self.cell) if self.home_station else None
+        if next_cell:
+            if not next_cell.floor & OBSTACLE:
                 self.cell= next_cell
                 self.energy-= 1
                 self.moves_count+= 1
-                self.path_station.pop(0)
-                self.distance_station-=1
+                self.update_distance_station()
                 return True
             else:
                 # Recalculate if path blocked
-                self.calculate_path_station()
+                self.home_station.invalidate_distance_field()
+                self.update_distance_station()
 
         return False
 
@@ -181,18 +175,18 @@ class RandomAgent(CellAgent):
         if self.cell == self.work_position:
             self.returning_to_work = False
             self.work_position = None
-            self.path_to_work = []
+            self.path_to_work = deque()
             return True
         
         # Follow path to work
         if self.path_to_work:
             next_cell = self.path_to_work[0]
-            if not any(isinstance(obj, ObstacleAgent) for obj in next_cell.agents):
+            if not next_cell.floor & OBSTACLE:
                 self.cell = next_cell
                 self.energy -= 1
                 self.moves_count += 1
-                self.path_to_work.pop(0)
-                self.calculate_path_station()
+                self.path_to_work.popleft()
+                self.update_distance_station()
                 return True
             else:
                 # Recalculate if obstacle found
@@ -205,10 +199,8 @@ class RandomAgent(CellAgent):
         if self.returning or self.returning_to_work:
             return
         
-        trash_here = [obj for obj in self.cell.agents if isinstance(obj, Trash)]
-        
-        if trash_here:
-            trash_obj = trash_here[0]
+        if self.cell.floor & TRASH:
+            trash_obj = next(obj for obj in self.cell.agents if isinstance(obj, Trash))
             if trash_obj.is_dirty:
                 trash_obj.is_dirty = False
                 trash_obj.remove()
@@ -216,20 +208,18 @@ class RandomAgent(CellAgent):
     def charge(self):
         """
         Charge battery at charging station by 5% per step.
-        Waits if another roomba is charging at the same station.
+        Joins the station queue and waits until the station grants the charger.
         
         Returns:
             bool: True if charging, False if waiting or no station
         """
-        station_here = [obj for obj in self.cell.agents if isinstance(obj, Station)]
-        
-        if station_here:
-            #Verify if there is no roomba charging in this station
-            roombas_here= [obj for obj in self.cell.agents if isinstance(obj, RandomAgent) and obj!=self]
+        if self.cell.floor & STATION:
+            station= self.queued_station or next(obj for obj in self.cell.agents if isinstance(obj, Station))
 
-            #Wait until station gets dissocupied
-            if any(r.energy<100 for r in roombas_here):
+            #Wait in the queue until the station gets dissocupied
+            if not station.request(self):
                 self.waiting_station=True
+                self.queued_station= station
                 return False
             
             # Charge battery
@@ -238,12 +228,14 @@ class RandomAgent(CellAgent):
 
             # When fully charged, return to work position
             if self.energy >= 100:
+                station.release(self)
+                self.queued_station= None
                 self.returning = False
                 self.waiting_station= False
                 if self.work_position:
                     self.returning_to_work = True
                     self.calculate_path_to_work()
-                self.calculate_path_station()
+                self.update_distance_station()
 
             return True
         self.waiting_station=False
@@ -254,6 +246,10 @@ class RandomAgent(CellAgent):
         Execute one simulation step using subsumption architecture.
         Priority: Survival > Charging > Navigation > Exploration
         """
+        # Queued roombas do nothing until the station grants them the charger
+        if self.queued_station and self.queued_station.charger is not self:
+            return
+
         # Calculate energy needed to safely return (distance + 10% margin)
         energy_needed = self.distance_station + 10
         
@@ -282,7 +278,7 @@ class RandomAgent(CellAgent):
         if self.returning:
             if self.move_station():
                 return
-            self.calculate_path_station()
+            self.update_distance_station()
             return
         
         # Priority 4: Normal behavior - explore and clean
@@ -301,7 +297,15 @@ class Trash(FixedAgent):
     def __init__(self, model, cell):
         super().__init__(model)
         self.cell = cell
+        self.cell.floor |= TRASH
         self.is_dirty = True
+        self.model.trash_count += 1
+
+    def remove(self):
+        """Remove the trash from the grid and clear its floor flag"""
+        self.cell.floor &= ~TRASH
+        self.model.trash_count -= 1
+        super().remove()
 
     def step(self):
         pass
@@ -314,6 +318,7 @@ class ObstacleAgent(FixedAgent):
     def __init__(self, model, cell):
         super().__init__(model)
         self.cell = cell
+        self.cell.floor |= OBSTACLE
         self.is_obstacle = True
 
     def step(self):
@@ -323,11 +328,98 @@ class Station(FixedAgent):
     """
     Charging station for roombas.
     Recharges battery by 5% per step.
-    Can be shared by multiple roombas with waiting system.
+    Can be shared by multiple roombas, which wait in a queue for the charger.
+
+    Attributes:
+        distances: BFS distance from each reachable cell to the station
+        next_hops: Next cell to move to from each reachable cell
+        charger: Roomba currently charging
+        queue: Roombas waiting for the charger, in arrival order
+        served: Number of roombas granted the charger after waiting
+        total_wait: Steps waited by the served roombas
     """
     def __init__(self, model, cell):
         super().__init__(model)
         self.cell = cell
+        self.cell.floor |= STATION
+        self.distances = None
+        self.next_hops = None
+        self.charger = None
+        self.queue = deque()
+        self.queued_at = {}
+        self.served = 0
+        self.total_wait = 0
+
+    @property
+    def queue_length(self):
+        """Roombas waiting for the charger"""
+        return len(self.queue)
+
+    @property
+    def average_wait(self):
+        """Average steps waited by the roombas served from the queue"""
+        return self.total_wait / self.served if self.served else 0
+
+    def request(self, roomba):
+        """
+        Ask for the charger, joining the queue if it is taken.
+        Returns:
+            bool: True if the roomba holds the charger
+        """
+        if self.charger is None:
+            self.charger = roomba
+        elif self.charger is not roomba and roomba not in self.queued_at:
+            self.queue.append(roomba)
+            self.queued_at[roomba] = self.model.current_step
+        return self.charger is roomba
+
+    def release(self, roomba):
+        """Free the charger and grant it to the next roomba in the queue"""
+        if self.charger is not roomba:
+            return
+
+        self.charger = None
+        if self.queue:
+            self.charger = self.queue.popleft()
+            self.total_wait += self.model.current_step - self.queued_at.pop(self.charger)
+            self.served += 1
+
+    def calculate_distance_field(self):
+        """
+        Calculate the distance field of the station using a reverse BFS.
+        Obstacles are static, so it is only recalculated when they change.
+        """
+        self.distances = {self.cell: 0}
+        self.next_hops = {self.cell: None}
+        queue = deque([self.cell])
+
+        while queue:
+            current_cell = queue.popleft()
+
+            # Direct connections avoid building a neighborhood collection per cell
+            for neighbor in current_cell.connections.values():
+                if neighbor not in self.distances:
+                    if not neighbor.floor & OBSTACLE:
+                        self.distances[neighbor] = self.distances[current_cell] + 1
+                        self.next_hops[neighbor] = current_cell
+                        queue.append(neighbor)
+
+    def invalidate_distance_field(self):
+        """Discard the distance field so it is recalculated on the next lookup"""
+        self.distances = None
+        self.next_hops = None
+
+    def distance_from(self, cell):
+        """Steps needed to reach the station from cell (inf if unreachable)"""
+        if self.distances is None:
+            self.calculate_distance_field()
+        return self.distances.get(cell, float('inf'))
+
+    def next_hop_from(self, cell):
+        """Next cell on a shortest path from cell to the station"""
+        if self.next_hops is None:
+            self.calculate_distance_field()
+        return self.next_hops.get(cell)
     
     def step(self):
         pass
@@ -0,0 +1,331 @@
+import numpy as np
+from scipy.sparse import csr_matrix
+from scipy.sparse.csgraph import dijkstra
+
+from .agent import OBSTACLE, TRASH, STATION
+
+# Same constants used by RandomAgent
+MAX_ENERGY = 100
+CHARGE_AMOUNT = 5
+SAFETY_MARGIN = 10
+
+# Moore neighbourhood, in (dx, dy) order
+OFFSETS = np.array([(-1, -1), (-1, 0), (-1, 1), (0, -1), (0, 1), (1, -1), (1, 0), (1, 1)])
+
+# Distance stored for cells without a known path to the station
+FAR = np.iinfo(np.int16).max
+
+
+class RoombaFleet:
+    """
+    Struct-of-arrays engine for the RandomAgent rules.
+
+    Every roomba is a row in a set of NumPy arrays and the whole fleet is
+    advanced with batched operations, following the same priorities as
+    RandomAgent.step: charge, return to work, return to station, explore.
+
+    Differences with the agent based version:
+    - All roombas decide on the state at the start of the step. Two roombas
+      reaching the same trash clean it once.
+    - A station charges one roomba at a time, the one that was already
+      charging or a random one, while the rest wait.
+    - Distance fields only cover the cells up to MAX_ENERGY steps away from
+      each station. Roombas further away always return, walking greedily
+      towards the station until they get back into its field.
+    - The path back to work is the path followed to the station, reversed.
+
+    Attributes:
+        floor: (width, height) uint8 array with OBSTACLE / TRASH / STATION flags
+        pos: Flat cell index (x * height + y) of every roomba
+        station: Flat cell index of the home station of every roomba
+        energy: Battery level of every roomba
+        moves: Movements made by every roomba
+        alive: Whether the roomba is still in the simulation
+    """
+    def __init__(self, model, floor, positions, stations, energy=MAX_ENERGY):
+        """
+        Creates the fleet.
+        Args:
+            model: Model reference, used for its rng and counters
+            floor: (width, height) uint8 array with the floor flags
+            positions: (n, 2) array with the starting cell of each roomba
+            stations: (n, 2) array with the home station of each roomba
+            energy: Initial battery level (default 100)
+        """
+        self.model = model
+        self.rng = model.rng
+        self.floor = floor
+        self.width, self.height = floor.shape
+        self.flat_floor = floor.reshape(-1)
+        self.flat_offsets = OFFSETS[:, 0] * self.height + OFFSETS[:, 1]
+
+        positions = np.asarray(positions, dtype=np.int64).reshape(-1, 2)
+        stations = np.asarray(stations, dtype=np.int64).reshape(-1, 2)
+        n = len(positions)
+
+        self.pos = positions[:, 0] * self.height + positions[:, 1]
+        self.station = stations[:, 0] * self.height + stations[:, 1]
+        self.energy = np.full(n, energy, dtype=np.int64)
+        self.moves = np.zeros(n, dtype=np.int64)
+        self.alive = np.ones(n, dtype=bool)
+        self.dist = np.zeros(n, dtype=np.int64)
+
+        # Behaviour flags, as in RandomAgent
+        self.returning = np.zeros(n, dtype=bool)
+        self.to_work = np.zeros(n, dtype=bool)
+        self.waiting = np.zeros(n, dtype=bool)
+        self.charging = np.zeros(n, dtype=bool)
+        self.has_work = np.zeros(n, dtype=bool)
+
+        # Ring buffer with the cells visited on the way to the station
+        self.trail_size = 2 * MAX_ENERGY
+        self.trail = np.zeros((n, self.trail_size), dtype=np.int64)
+        self.trail_len = np.zeros(n, dtype=np.int64)
+        self.trail_stop = np.zeros(n, dtype=np.int64)
+
+        self.calculate_distance_fields()
+        self.update_counters()
+
+    def calculate_distance_fields(self, chunk=64):
+        """
+        Calculate the distance field of every station over a window around it.
+        Uses a BFS bounded to MAX_ENERGY steps, chunk stations at a time.
+        """
+        n = len(self.station)
+        radius = MAX_ENERGY
+        win_w = min(2 * radius + 1, self.width)
+        win_h = min(2 * radius + 1, self.height)
+
+        sx, sy = np.divmod(self.station, self.height)
+        self.window_x = np.clip(sx - radius, 0, self.width - win_w)
+        self.window_y = np.clip(sy - radius, 0, self.height - win_h)
+
+        # Padded by one FAR cell on each side so neighbours never go out of range
+        self.fields = np.full((n, win_w + 2, win_h + 2), FAR, dtype=np.int16)
+
+        graph = self.passability_graph()
+        for start in range(0, n, chunk):
+            rows = dijkstra(
+                graph, indices=self.station[start:start + chunk], unweighted=True, limit=radius
+            )
+            rows = rows.reshape(-1, self.width, self.height)
+
+            for i, row in enumerate(rows, start=start):
+                ox, oy = self.window_x[i], self.window_y[i]
+                window = row[ox:ox + win_w, oy:oy + win_h]
+                reachable = np.isfinite(window)
+                self.fields[i, 1:-1, 1:-1][reachable] = window[reachable]
+
+    def passability_graph(self):
+        """Sparse graph linking every pair of neighbouring cells without obstacles."""
+        passable = (self.flat_floor & OBSTACLE) == 0
+        x, y = np.divmod(np.flatnonzero(passable), self.height)
+        src = []
+        dst = []
+
+        for dx, dy in OFFSETS:
+            nx, ny = x + dx, y + dy
+            inside = (nx >= 0) & (nx < self.width) & (ny >= 0) & (ny < self.height)
+            a = x[inside] * self.height + y[inside]
+            b = nx[inside] * self.height + ny[inside]
+            keep = passable[b]
+            src.append(a[keep])
+            dst.append(b[keep])
+
+        src = np.concatenate(src)
+        dst = np.concatenate(dst)
+        size = self.width * self.height
+        return csr_matrix((np.ones(len(src), dtype=np.int8), (src, dst)), shape=(size, size))
+
+    def field_values(self, idx, cells):
+        """
+        Distance to the home station of each roomba in idx from the given cells.
+        cells may be 1-D (one cell per roomba) or 2-D (several per roomba).
+        """
+        x, y = np.divmod(cells, self.height)
+        wx = self.window_x[idx]
+        wy = self.window_y[idx]
+        if cells.ndim == 2:
+            wx = wx[:, None]
+            wy = wy[:, None]
+            rows = idx[:, None]
+        else:
+            rows = idx
+
+        # Local coordinates in the padded window
+        lx = x - wx + 1
+        ly = y - wy + 1
+        inside = (lx >= 0) & (lx < self.fields.shape[1]) & (ly >= 0) & (ly < self.fields.shape[2])
+        lx = np.where(inside, lx, 0)
+        ly = np.where(inside, ly, 0)
+        return np.where(inside, self.fields[rows, lx, ly], FAR)
+
+    def neighbors(self, idx):
+        """Flat indices and floor flags of the 8 neighbours of each roomba"""
+        cells = self.pos[idx][:, None] + self.flat_offsets
+        return cells, self.flat_floor[cells]
+
+    def move(self, idx, cells):
+        """Move the roombas to the given cells, spending one unit of energy"""
+        self.pos[idx] = cells
+        self.energy[idx] -= 1
+        self.moves[idx] += 1
+
+    def record_trail(self, idx):
+        """Save the current cell of the roombas that have a work position to go back to"""
+        idx = idx[self.has_work[idx]]
+        self.trail[idx, self.trail_len[idx] % self.trail_size] = self.pos[idx]
+        self.trail_len[idx] += 1
+
+    def charge(self, idx):
+        """
+        Charge the roombas in idx that are on a station, one per station.
+        Returns:
+            array: Roombas that spent the step charging or waiting
+        """
+        at_station = (self.flat_floor[self.pos[idx]] & STATION) != 0
+        self.waiting[idx[~at_station]] = False
+        contenders = idx[at_station]
+
+        was_charging = self.charging[contenders]
+        self.charging[idx] = False
+        if contenders.size == 0:
+            return contenders
+
+        # Grant each station to the roomba already charging, otherwise a random one
+        priority = was_charging + self.rng.random(contenders.size)
+        order = np.lexsort((-priority, self.pos[contenders]))
+        ordered = contenders[order]
+        _, first = np.unique(self.pos[ordered], return_index=True)
+        granted = ordered[first]
+
+        self.waiting[contenders] = True
+        self.charging[granted] = True
+        self.energy[granted] = np.minimum(self.energy[granted] + CHARGE_AMOUNT, MAX_ENERGY)
+
+        # When fully charged, return to work position
+        full = granted[self.energy[granted] >= MAX_ENERGY]
+        self.returning[full] = False
+        self.waiting[full] = False
+        self.charging[full] = False
+        back = full[self.has_work[full]]
+        self.to_work[back] = True
+        self.trail_stop[back] = np.maximum(self.trail_len[back] - self.trail_size, 0)
+
+        return contenders
+
+    def move_to_work(self, idx):
+        """Walk back the trail towards the work position"""
+        arrived = self.trail_len[idx] <= self.trail_stop[idx]
+        done = idx[arrived]
+        self.to_work[done] = False
+        self.has_work[done] = False
+
+        going = idx[~arrived]
+        self.trail_len[going] -= 1
+        self.move(going, self.trail[going, self.trail_len[going] % self.trail_size])
+
+    def move_station(self, idx):
+        """Move towards the charging station"""
+        on_station = (self.flat_floor[self.pos[idx]] & STATION) != 0
+        self.waiting[idx[on_station]] = True
+        self.returning[idx[on_station]] = False
+
+        idx = idx[~on_station]
+        cells, flags = self.neighbors(idx)
+        free = (flags & OBSTACLE) == 0
+
+        # Opportunistically take any station in the neighbourhood
+        stations = free & ((flags & STATION) != 0)
+        docking = stations.any(axis=1)
+        dock = idx[docking]
+        self.record_trail(dock)
+        self.move(dock, cells[docking, stations[docking].argmax(axis=1)])
+        self.returning[dock] = False
+        self.waiting[dock] = True
+
+        # Follow the station distance field
+        idx = idx[~docking]
+        cells = cells[~docking]
+        free = free[~docking]
+        values = self.field_values(idx, cells)
+        best = values.argmin(axis=1)
+        rows = np.arange(len(idx))
+        in_field = values[rows, best] < FAR
+
+        # Outside the field, greedy step that gets closer to the station
+        sx, sy = np.divmod(self.station[idx], self.height)
+        cx, cy = np.divmod(cells, self.height)
+        chebyshev = np.maximum(np.abs(cx - sx[:, None]), np.abs(cy - sy[:, None]))
+        chebyshev[~free] = np.iinfo(np.int64).max
+        greedy = chebyshev.argmin(axis=1)
+
+        step = np.where(in_field, best, greedy)
+        can_move = in_field | free.any(axis=1)
+        movers = idx[can_move]
+        self.record_trail(movers)
+        self.move(movers, cells[rows[can_move], step[can_move]])
+
+    def explore(self, idx):
+        """Random move preferring trash, then clean the current cell"""
+        movers = idx[(self.rng.random(idx.size) < 0.5) & (self.energy[idx] > 0)]
+        cells, flags = self.neighbors(movers)
+        free = (flags & OBSTACLE) == 0
+        trash = free & ((flags & TRASH) != 0)
+
+        # Choose randomly between trash cells, otherwise between free cells
+        options = np.where(trash.any(axis=1)[:, None], trash, free)
+        scores = np.where(options, self.rng.random(options.shape), -1.0)
+        choice = scores.argmax(axis=1)
+        can_move = options.any(axis=1)
+        rows = np.flatnonzero(can_move)
+        self.move(movers[can_move], cells[rows, choice[can_move]])
+
+        # Clean each dirty cell once, even if several roombas are on it
+        here = self.pos[idx]
+        dirty = np.unique(here[(self.flat_floor[here] & TRASH) != 0])
+        self.flat_floor[dirty] &= ~TRASH
+        self.model.trash_count -= len(dirty)
+
+        # Handle death
+        self.alive[idx[self.energy[idx] <= 0]] = False
+
+    def step(self):
+        """
+        Advance every roomba one step.
+        Priority: Survival > Charging > Navigation > Exploration
+        """
+        idx = np.flatnonzero(self.alive)
+        self.dist[idx] = self.field_values(idx, self.pos[idx])
+
+        # Activate returning mode if energy is low
+        low = idx[(self.energy[idx] <= self.dist[idx] + SAFETY_MARGIN) & ~self.returning[idx]]
+        new_work = low[~self.to_work[low]]
+        self.has_work[new_work] = True
+        self.trail_len[new_work] = 0
+        self.returning[low] = True
+
+        # Priority 1: Charge if at station or waiting
+        needs_charge = idx[(self.energy[idx] < MAX_ENERGY) | self.waiting[idx]]
+        busy = self.charge(needs_charge)
+        idx = np.setdiff1d(idx, busy, assume_unique=True)
+
+        to_work = self.to_work[idx]
+        returning = self.returning[idx]
+
+        # Priority 2: Return to work position after charging
+        self.move_to_work(idx[to_work])
+
+        # Priority 3: Return to charging station if low energy
+        self.move_station(idx[~to_work & returning])
+
+        # Priority 4: Normal behavior - explore and clean
+        self.explore(idx[~to_work & ~returning])
+
+        self.update_counters()
+
+    def update_counters(self):
+        """Mirror the fleet totals into the model counters"""
+        self.model.roomba_count = int(self.alive.sum())
+        self.model.total_energy = int(self.energy[self.alive].sum())
+        self.model.total_moves = int(self.moves[self.alive].sum())
@@ -1,8 +1,11 @@
+import numpy as np
 from mesa import Model
-from mesa.discrete_space import OrthogonalMooreGrid
+from mesa.agent import AgentSet
+from mesa.discrete_space import OrthogonalMooreGrid, FixedAgent
 from mesa.datacollection import DataCollector
 
-from .agent import RandomAgent, ObstacleAgent, Trash, Station
+from .agent import RandomAgent, ObstacleAgent, Trash, Station, OBSTACLE, TRASH, STATION
+from .fleet import RoombaFleet
 
 class RandomModel(Model):
     """
@@ -21,10 +24,18 @@ class RandomModel(Model):
         max_steps: Maximum simulation time
         dirty_percentage: Initial percentage of dirty cells (0.0-1.0)
         obstacle_percentage: Percentage of obstacle cells (0.0-1.0)
+        step_fixed_agents: Also shuffle and step fixed agents (trash, obstacles, stations)
+        engine: "agents" for one mesa agent per object, "vectorized" to run the
+            roombas as a RoombaFleet over a NumPy floor (no mesa grid nor agents)
     """
-    def __init__(self, simulation_mode=1, num_agents=1, width=8, height=8, seed=42, max_steps=1000, dirty_percentage=0.2, obstacle_percentage=0.1):
+    def __init__(self, simulation_mode=1, num_agents=1, width=8, height=8, seed=42, max_steps=1000, dirty_percentage=0.2, obstacle_percentage=0.1, step_fixed_agents=False, engine="agents"):
 
         super().__init__(seed=seed)
+        self.step_fixed_agents = step_fixed_agents
+
+        # Agents with behaviour, the only ones activated each step by default
+        self.active_agents = AgentSet([], random=self.random)
+
         self.simulation_mode = simulation_mode
         self.num_agents = num_agents if simulation_mode == 2 else 1
         self.seed = seed
@@ -34,89 +45,184 @@ class RandomModel(Model):
         self.current_step = 0
         self.dirty_percentage = dirty_percentage
         self.obstacle_percentage = obstacle_percentage
+        self.engine = engine
+        self.fleet = None
+
+        # Live counters kept up to date by the agents themselves
+        self.trash_count = 0
+        self.roomba_count = 0
+        self.total_energy = 0
+        self.total_moves = 0
+
+        self.running = True
+
+        # Metrics for completion tracking
+        self.all_clean_step = None  # Step when all trash was cleaned
+        self.initial_trash_count = 0  # Total initial trash count
+
+        if engine == "vectorized":
+            self.grid = None
+            self.create_fleet()
+        else:
+            self.create_agents()
+            self.create_trash()
+            self.create_obs()
+            self.update_station_fields()
 
-        self.grid = OrthogonalMooreGrid([width, height], torus=False)
+        # Data collection for statistics and visualization
+        self.datacollector = DataCollector(
+            model_reporters={
+                "Trash": "trash_count",
+                "Roombas": "roomba_count",
+                "Average Energy": lambda m: m.total_energy / max(m.roomba_count, 1),
+                "Clean Percentage": lambda m: ((m.initial_trash_count - m.trash_count) / m.initial_trash_count * 100) if m.initial_trash_count > 0 else 100,
+                "Movements": "total_moves",
+                "Energy": "total_energy",
+            },
+            # Only roombas and stations have per-agent data, so Trash and obstacles are not visited
+            agenttype_reporters={
+                RandomAgent: {
+                    "Energy": "energy",
+                    "Moves": "moves_count",
+                },
+                Station: {
+                    "Queue": "queue_length",
+                    "Average Wait": "average_wait",
+                },
+            }
+        )
+
+    def create_agents(self):
+        """Create the grid with its border, and the roombas with their stations."""
+        # The grid shares the model random generator so that runs are reproducible
+        self.grid = OrthogonalMooreGrid([self.width, self.height], torus=False, random=self.random)
+
+        # Obstacle / trash / station flags of every cell, read by the agents
+        # as cell.floor instead of scanning cell.agents
+        self.grid.create_property_layer("floor", default_value=np.uint8(0), dtype=np.uint8)
 
         # Identify the coordinates of the border of the grid
-        border = [(x,y)
-                  for y in range(height)
-                  for x in range(width)
-                  if y in [0, height-1] or x in [0, width - 1]]
+        border = {(x, y) for x in range(self.width) for y in (0, self.height - 1)}
+        border |= {(x, y) for x in (0, self.width - 1) for y in range(self.height)}
 
         # Create the border cells
-        for _, cell in enumerate(self.grid):
-            if cell.coordinate in border:
-                ObstacleAgent(self, cell=cell)
+        for coordinate in border:
+            ObstacleAgent(self, cell=self.grid[coordinate])
 
         # Simulation 1: Single agent at (1,1) with its station
-        if simulation_mode == 1:
+        if self.simulation_mode == 1:
             first_cell = self.grid[(1, 1)]
             first_station = Station(self, first_cell)
             first_agent = RandomAgent(self, first_cell, energy=100, home_station=first_station)
         
         # Simulation 2: Multiple agents at random positions with their stations
         else:
-            for _ in range(self.num_agents):
-                empty_cell = self.grid.select_random_empty_cell()
-                if empty_cell:
-                    station = Station(self, empty_cell)
-                    agent = RandomAgent(self, empty_cell, energy=100, home_station=station)
+            for empty_cell in self.sample_empty_cells(self.num_agents):
+                station = Station(self, empty_cell)
+                agent = RandomAgent(self, empty_cell, energy=100, home_station=station)
+
+    def create_fleet(self):
+        """
+        Create the floor as a NumPy array and the roombas as a RoombaFleet.
+        Stations, trash and obstacles are sampled at once, without replacement,
+        from the free cells inside the border.
+        """
+        floor = np.zeros((self.width, self.height), dtype=np.uint8)
+        floor[[0, -1], :] = OBSTACLE
+        floor[:, [0, -1]] = OBSTACLE
+        flat = floor.reshape(-1)
+
+        num_trash = int(self.width * self.height * self.dirty_percentage)
+        num_obs = int(self.width * self.height * self.obstacle_percentage)
+        self.initial_trash_count = num_trash
 
-        self.running = True
+        # Simulation 1: Single agent at (1,1), otherwise at random positions
+        first = [1 * self.height + 1] if self.simulation_mode == 1 else []
+        num_random = 0 if self.simulation_mode == 1 else self.num_agents
+        free = np.setdiff1d(np.flatnonzero(flat == 0), first)
 
-        # Metrics for completion tracking
-        self.all_clean_step = None  # Step when all trash was cleaned
-        self.initial_trash_count = 0  # Total initial trash count
+        total = min(num_random + num_trash + num_obs, len(free))
+        chosen = self.rng.choice(free, size=total, replace=False)
+        stations = np.concatenate([first, chosen[:num_random]]).astype(np.int64)
+        trash = chosen[num_random:num_random + num_trash]
+        obstacles = chosen[num_random + num_trash:]
 
-        self.create_trash()
-        self.create_obs()
+        flat[stations] |= STATION
+        flat[trash] |= TRASH
+        flat[obstacles] |= OBSTACLE
+        self.trash_count = len(trash)
 
-        # Data collection for statistics and visualization
-        self.datacollector = DataCollector(
-            model_reporters={
-                "Trash": lambda m: sum(1 for agent in m.agents if isinstance(agent, Trash)),
-                "Roombas": lambda m: sum(1 for agent in m.agents if isinstance(agent, RandomAgent)),
-                "Average Energy": lambda m: sum(agent.energy for agent in m.agents if isinstance(agent, RandomAgent)) / max(sum(1 for agent in m.agents if isinstance(agent, RandomAgent)), 1),
-                "Clean Percentage": lambda m: ((m.initial_trash_count - sum(1 for agent in m.agents if isinstance(agent, Trash))) / m.initial_trash_count * 100) if m.initial_trash_count > 0 else 100,
-                "Movements": lambda m: sum(agent.moves_count for agent in m.agents if isinstance(agent, RandomAgent)),
-                "Energy": lambda m: sum(agent.energy for agent in m.agents if isinstance(agent, RandomAgent)),
-            },
-            agent_reporters={
-                "Energy": "energy",
-                "Moves": "moves_count",
-            }
-        )
+        coordinates = np.column_stack(np.divmod(stations, self.height))
+        self.fleet = RoombaFleet(self, floor, coordinates, coordinates)
 
     def create_trash(self):
         """Create trash objects in random empty cells based on dirty_percentage."""
         num_trash = int(self.grid.width * self.grid.height * self.dirty_percentage)
         self.initial_trash_count = num_trash
-        
-        for _ in range(num_trash):
-            empty_cell = self.grid.select_random_empty_cell()
-            if empty_cell:
-                Trash(self, empty_cell)
+
+        for empty_cell in self.sample_empty_cells(num_trash):
+            Trash(self, empty_cell)
 
     def create_obs(self):
         """Create obstacle objects in random empty cells based on obstacle_percentage."""
         num_obs = int(self.grid.width * self.grid.height * self.obstacle_percentage)
-        
-        for _ in range(num_obs):
-            empty_cell = self.grid.select_random_empty_cell()
-            if empty_cell:
-                ObstacleAgent(self, empty_cell)
+
+        for empty_cell in self.sample_empty_cells(num_obs):
+            ObstacleAgent(self, empty_cell)
+
+    def sample_empty_cells(self, k):
+        """
+        Sample up to k distinct empty cells at once, without replacement.
+        Every object placed during set up flags the floor layer (roombas stand
+        on their station), so empty cells are the ones with no flag.
+        """
+        empty = np.flatnonzero(self.grid.floor.data.reshape(-1) == 0)
+        chosen = self.random.sample(range(len(empty)), min(k, len(empty)))
+        return [self.grid[divmod(int(empty[i]), self.height)] for i in chosen]
+
+    def register_agent(self, agent):
+        """Register the agent, keeping the non fixed ones in active_agents."""
+        super().register_agent(agent)
+        if not isinstance(agent, FixedAgent):
+            self.active_agents.add(agent)
+
+    def deregister_agent(self, agent):
+        """Deregister the agent, also from active_agents."""
+        super().deregister_agent(agent)
+        self.active_agents.discard(agent)
+
+    def update_station_fields(self):
+        """Recalculate station distance fields after the obstacles change."""
+        for station in self.agents_by_type.get(Station, []):
+            station.invalidate_distance_field()
+
+        for agent in self.agents_by_type.get(RandomAgent, []):
+            agent.update_distance_station()
 
     def step(self):
         """Execute one simulation step and collect data."""
-        # Execute step for all agents in random order
-        self.agents.shuffle_do("step")
-        
+        self.step_agents()
+
         # Collect statistics
         self.datacollector.collect(self)
         self.current_step += 1
-        
+
+        self.check_completion()
+
+    def step_agents(self):
+        """Execute step for the active agents in random order."""
+        # Fixed agents do nothing on their step so they are skipped unless requested
+        if self.fleet is not None:
+            self.fleet.step()
+        elif self.step_fixed_agents:
+            self.agents.shuffle_do("step")
+        else:
+            self.active_agents.shuffle_do("step")
+
+    def check_completion(self):
+        """Stop the simulation when the floor is clean or the time is over."""
         # Analize whether it is clean or not
-        if sum(1 for agent in self.agents if isinstance(agent, Trash)) == 0:
+        if self.trash_count == 0:
             if self.all_clean_step is None:
                 self.all_clean_step = self.current_step
             self.running = False
@@ -124,5 +230,3 @@ class RandomModel(Model):
         #Stop when limit time exceeded
         if self.current_step >= self.max_steps:
             self.running = False
-
-
@@ -0,0 +1,70 @@
+from collections import deque
+from heapq import heappush, heappop
+from itertools import count
+
+
+def octile_distance(a, b, diagonal_cost=1):
+    """
+    Octile distance between two grid coordinates.
+    With the default diagonal_cost of 1 every Moore move costs the same,
+    which is how roombas spend energy, and it matches the Chebyshev distance.
+    """
+    dx = abs(a[0] - b[0])
+    dy = abs(a[1] - b[1])
+    return max(dx, dy) + (diagonal_cost - 1) * min(dx, dy)
+
+
+def find_path(start, target, is_passable, diagonal_cost=1):
+    """
+    Find a shortest path between two cells using A*.
+
+    Args:
+        start: Cell where the path starts
+        target: Cell to reach
+        is_passable: Function that tells whether a cell can be entered
+        diagonal_cost: Cost of a diagonal move (default 1, same as straight)
+
+    Returns:
+        deque: Cells to visit after start up to target (empty if unreachable)
+    """
+    if start == target:
+        return deque()
+
+    goal = target.coordinate
+    tie = count()
+    open_heap = [(octile_distance(start.coordinate, goal, diagonal_cost), next(tie), start)]
+    g_score = {start: 0}
+    parents = {start: None}
+    closed = set()
+
+    while open_heap:
+        _, _, current_cell = heappop(open_heap)
+
+        if current_cell == target:
+            # Rebuild the path walking back through the parents
+            path = deque()
+            while current_cell != start:
+                path.appendleft(current_cell)
+                current_cell = parents[current_cell]
+            return path
+
+        if current_cell in closed:
+            continue
+        closed.add(current_cell)
+
+        x, y = current_cell.coordinate
+        for neighbor in current_cell.neighborhood:
+            if neighbor in closed or not is_passable(neighbor):
+                continue
+
+            nx, ny = neighbor.coordinate
+            step_cost = diagonal_cost if nx != x and ny != y else 1
+            cost = g_score[current_cell] + step_cost
+
+            if cost < g_score.get(neighbor, float('inf')):
+                g_score[neighbor] = cost
+                parents[neighbor] = current_cell
+                priority = cost + octile_distance(neighbor.coordinate, goal, diagonal_cost)
+                heappush(open_heap, (priority, next(tie), neighbor))
+
+    return deque()
@@ -0,0 +1,144 @@
+"""
+Headless parameter sweep for the roomba simulation.
+
+Runs RandomModel over every combination of the given parameters and seeds
+in a process pool. Every finished run is cached on disk as a JSON file keyed
+by its parameters and seed, so running a sweep again only computes new points.
+
+Example:
+    python sweep.py --num-agents 5 10 20 --dirty 0.1 0.2 --size 20 50 --seeds 10 --output sweep.csv
+"""
+import argparse
+import csv
+import hashlib
+import itertools
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+from random_agents.model import RandomModel
+
+
+def cache_key(params):
+    """Hash of the run parameters (seed included) used as cache file name."""
+    encoded = json.dumps(params, sort_keys=True).encode()
+    return hashlib.sha1(encoded).hexdigest()
+
+
+def run_point(params):
+    """
+    Run one simulation until it finishes.
+    Args:
+        params: Keyword arguments for RandomModel, seed included
+    Returns:
+        dict: The parameters plus all_clean_step, clean_percentage, movements and steps
+    """
+    model = RandomModel(**params)
+    model.run_model()
+
+    if model.initial_trash_count > 0:
+        clean = (model.initial_trash_count - model.trash_count) / model.initial_trash_count * 100
+    else:
+        clean = 100
+
+    return {
+        **params,
+        "all_clean_step": model.all_clean_step,
+        "clean_percentage": clean,
+        "movements": model.total_moves,
+        "steps": model.current_step,
+    }
+
+
+def load_cached(cache_dir, key):
+    """Cached result for key, or None if it was not computed yet."""
+    path = os.path.join(cache_dir, f"{key}.json")
+    if not os.path.exists(path):
+        return None
+    with open(path) as cached:
+        return json.load(cached)
+
+
+def save_cached(cache_dir, key, result):
+    """Store a result, writing to a temporary file first so it is never left half written."""
+    path = os.path.join(cache_dir, f"{key}.json")
+    with open(path + ".tmp", "w") as cached:
+        json.dump(result, cached)
+    os.replace(path + ".tmp", path)
+
+
+def sweep_points(parameters, seeds):
+    """All parameter combinations, one dict per (combination, seed)."""
+    names = list(parameters)
+    for values in itertools.product(*(parameters[name] for name in names)):
+        for seed in seeds:
+            yield {**dict(zip(names, values)), "seed": seed}
+
+
+def sweep(points, cache_dir=".sweep_cache", workers=None):
+    """
+    Run a parameter sweep, reusing the cached runs.
+    Args:
+        points: RandomModel keyword arguments of every run, seed included
+        cache_dir: Directory where the results are cached
+        workers: Number of processes (default: number of CPUs)
+    Returns:
+        list: One result dict per point, in the same order
+    """
+    os.makedirs(cache_dir, exist_ok=True)
+    points = list(points)
+    keys = [cache_key(point) for point in points]
+    results = [load_cached(cache_dir, key) for key in keys]
+
+    missing = [i for i, result in enumerate(results) if result is None]
+    print(f"{len(points)} points, {len(points) - len(missing)} cached, {len(missing)} to run")
+
+    if missing:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            runs = pool.map(run_point, [points[i] for i in missing])
+            for i, result in zip(missing, runs):
+                save_cached(cache_dir, keys[i], result)
+                results[i] = result
+
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Parameter sweep for the roomba simulation")
+    parser.add_argument("--num-agents", type=int, nargs="+", default=[5])
+    parser.add_argument("--dirty", type=float, nargs="+", default=[0.2])
+    parser.add_argument("--obstacles", type=float, nargs="+", default=[0.1])
+    parser.add_argument("--size", type=int, nargs="+", default=[20], help="Square grid sizes")
+    parser.add_argument("--max-steps", type=int, default=1000)
+    parser.add_argument("--engine", choices=["agents", "vectorized"], default="agents")
+    parser.add_argument("--seeds", type=int, default=5, help="Number of seeds, starting at 0")
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--cache", default=".sweep_cache")
+    parser.add_argument("--output", default="sweep.csv")
+    args = parser.parse_args()
+
+    points = []
+    for size in args.size:
+        parameters = {
+            "simulation_mode": [2],
+            "num_agents": args.num_agents,
+            "width": [size],
+            "height": [size],
+            "dirty_percentage": args.dirty,
+            "obstacle_percentage": args.obstacles,
+            "max_steps": [args.max_steps],
+            "engine": [args.engine],
+        }
+        points.extend(sweep_points(parameters, range(args.seeds)))
+
+    results = sweep(points, args.cache, args.workers)
+
+    with open(args.output, "w", newline="") as output:
+        writer = csv.DictWriter(output, fieldnames=list(results[0]))
+        writer.writeheader()
+        writer.writerows(results)
+    print(f"Results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()